@@ -1,77 +1,225 @@
+import functools
+import importlib.util
+import numpy as np
 from PIL import Image, ImageOps, ImageEnhance, ImageFilter
 
+# Optional JIT acceleration for the fused adjustment pass (falls back to NumPy). The kernels live
+# in jit_kernels and are only imported on first use, keeping numba's import cost off startup.
+NUMBA_AVAILABLE = importlib.util.find_spec('numba') is not None
+# Optional OpenCV for edge detection (falls back to Pillow's filter), imported lazily for the same reason
+CV2_AVAILABLE = importlib.util.find_spec('cv2') is not None
+
+# ITU-R 601-2 luma weights, the same ones Pillow uses for convert('L')
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# Pillow's ImageFilter.FIND_EDGES kernel (scale 1, offset 0)
+FIND_EDGES_KERNEL = np.array([[-1, -1, -1], [-1, 8, -1], [-1, -1, -1]], dtype=np.float32)
+
+def _blend_grayscale(image, gf):
+    """Blends an 'RGB'/'RGBA' image towards its own luminance by gf with Image.blend (in C); alpha is kept."""
+    gray = image.convert('LA' if image.mode == 'RGBA' else 'L').convert(image.mode)
+    return Image.blend(image, gray, gf)
+
+def _apply_fused_adjustments(image, brightness_val, contrast_val, saturation_val, grayscale_val, invert, as_luminance=False):
+    """
+    Applies brightness, contrast, saturation, grayscale blend and invert. With numba it is one fused
+    pass over a uint8 buffer, using the ImageEnhance formulas (blend against a black, mean-gray and
+    luminance degenerate respectively); without it, Pillow's own C operations are faster than NumPy.
+    Alpha (RGBA) is carried over untouched; full grayscale returns an 'L' image.
+    With as_luminance the result is always 'L'.
+    """
+    bf = brightness_val / 100.0; cf = contrast_val / 100.0
+    sf = saturation_val / 100.0; gf = grayscale_val / 100.0
+
+    # Full grayscale discards color anyway, so drop to 'L' up front and work on one channel. Not if brightness,
+    # contrast or saturation can clip a channel first: then the color steps run and luminance is taken afterwards
+    clips_channels = bf > 1.0 or cf > 1.0 or sf > 1.0
+    is_color = image.mode not in ('L', '1', 'LA') and (gf < 1.0 or clips_channels)
+    if is_color and gf >= 1.0: as_luminance = True # Full grayscale returns 'L': the luminance after the color steps
+    if is_color: target_mode = 'RGBA' if image.mode == 'RGBA' else 'RGB'
+    else: target_mode = 'L'
+    base = image.convert(target_mode) if image.mode != target_mode else image
+
+    if NUMBA_AVAILABLE:
+        import jit_kernels
+        src = np.asarray(base)
+        if src.ndim == 2: src = src[..., None]
+        mean = float(int(jit_kernels.fused_mean_luma(src, bf, is_color) + 0.5)) if cf != 1.0 else 0.0
+        out_mode = 'L' if as_luminance or not is_color else target_mode
+        out = np.empty(src.shape[:2] + (1 if out_mode == 'L' else src.shape[2],), dtype=np.uint8)
+        jit_kernels.fused_kernel(src, out, bf, cf, mean, sf, gf, invert, is_color, as_luminance)
+        return Image.fromarray(out[..., 0] if out_mode == 'L' else out, out_mode)
+
+    # Without numba: Pillow's C operations in the ImageEnhance order (brightness and contrast as one table)
+    image = base
+    if brightness_val != 100 or contrast_val != 100: image = _apply_tone_lut(image, brightness_val, contrast_val, False)
+    if is_color:
+        if sf != 1.0: image = ImageEnhance.Color(image).enhance(sf)
+        if as_luminance: image = image.convert('L') # The grayscale blend leaves luminance unchanged
+        elif gf > 0: image = _blend_grayscale(image, gf)
+    return _invert(image) if invert else image
+
+def _apply_tone_lut(image, brightness_val, contrast_val, invert):
+    """
+    Applies brightness, contrast and invert as one per-channel lookup table (Image.point, in C).
+    Only valid while no step mixes channels, i.e. with saturation and grayscale at neutral.
+    """
+    if image.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+        image = image.convert('L' if image.mode == '1' else 'RGB')
+    bf = brightness_val / 100.0; cf = contrast_val / 100.0
+    brightened = [min(v * bf, 255.0) for v in range(256)]
+
+    mean = 0
+    if cf != 1.0:
+        # Contrast pivots on the mean luminance after brightness; take it from the histogram instead of converting to 'L'
+        hist = image.histogram(); pixel_count = image.width * image.height
+        channel_weights = (1.0,) if image.mode in ('L', 'LA') else LUMA_WEIGHTS.tolist()
+        mean_luma = 0.0
+        for c, weight in enumerate(channel_weights):
+            mean_luma += weight * sum(n * brightened[v] for v, n in enumerate(hist[c * 256:(c + 1) * 256])) / pixel_count
+        mean = int(mean_luma + 0.5)
+
+    lut = []
+    for v in brightened:
+        v = v * cf + mean * (1.0 - cf)
+        if invert: v = 255.0 - v
+        lut.append(int(min(max(v, 0.0), 255.0)))
+    # Alpha ('LA', 'RGBA') gets an identity table
+    if image.mode in ('LA', 'RGBA'): return image.point(lut * (len(image.getbands()) - 1) + list(range(256)))
+    return image.point(lut * len(image.getbands()))
+
+@functools.lru_cache(maxsize=256)
+def _threshold_lut(threshold_val):
+    """256-entry lookup table for Image.point: 0 below threshold_val, 255 from it upwards."""
+    return tuple([0] * threshold_val + [255] * (256 - threshold_val))
+
+def _invert(image):
+    """Inverts an image in a single uint8 pass, leaving any alpha channel as it is."""
+    if image.mode == 'RGBA':
+        arr = np.array(image)
+        np.subtract(255, arr[..., :3], out=arr[..., :3])
+        return Image.fromarray(arr, 'RGBA')
+    if image.mode == 'LA': return image.point(list(range(255, -1, -1)) + list(range(256))) # Identity table for alpha
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('L' if image.mode == '1' else 'RGB')
+    return ImageOps.invert(image) # LUT-based, runs in C
+
+def _edge_detect(image):
+    """
+    FIND_EDGES on an 'L' image, inverted to black edges on white.
+    With OpenCV the filter and invert run on one uint8 array (same kernel and border handling as Pillow).
+    """
+    if not CV2_AVAILABLE: return ImageOps.invert(image.filter(ImageFilter.FIND_EDGES))
+    import cv2
+    src = np.asarray(image)
+    edges = cv2.filter2D(src, -1, FIND_EDGES_KERNEL) # Saturates to 0-255 like Pillow
+    # Pillow leaves the 1-pixel border unfiltered
+    edges[0, :] = src[0, :]; edges[-1, :] = src[-1, :]; edges[:, 0] = src[:, 0]; edges[:, -1] = src[:, -1]
+    cv2.bitwise_not(edges, dst=edges)
+    return Image.fromarray(edges, 'L')
+
+def _apply_final_conversion(image, threshold_enabled, threshold_val, edge_detect_enabled):
+    """Applies edge detection or threshold if enabled; both always return an 'L' image."""
+    # These steps modify the image further *only if* selected
+    if edge_detect_enabled:
+         print("Applying Edge Detection...")
+         # Edge detection requires grayscale input
+         base_for_filter = image.convert('L') if image.mode != 'L' else image
+         return _edge_detect(base_for_filter) # Inverted to get black edges on white BG
+    if threshold_enabled:
+         print(f"Applying threshold: {threshold_val}")
+         # Threshold requires grayscale input
+         base_for_filter = image.convert('L') if image.mode != 'L' else image
+         # 0/255 table applied L -> L in one C pass, no packing into mode '1' and converting back
+         return base_for_filter.point(_threshold_lut(threshold_val))
+    return image
+
+def _process_L(image, brightness_val, contrast_val, invert, sharpness_val):
+    """
+    Single-channel adjustments for 'L'/'1' images: never goes through RGB.
+    Saturation and grayscale are no-ops on one channel, so they are not taken at all.
+    """
+    if image.mode != 'L': image = image.convert('L')
+    if brightness_val != 100 or contrast_val != 100 or invert:
+        image = _apply_tone_lut(image, brightness_val, contrast_val, invert) # Brightness, contrast and invert as one LUT
+    if sharpness_val != 100: image = ImageEnhance.Sharpness(image).enhance(sharpness_val / 100.0)
+    return image
+
+def _apply_adjustments(image, brightness_val, contrast_val, saturation_val, grayscale_val, invert, sharpness_val, final_is_L):
+    """
+    Color/tone adjustments, grayscale, invert and sharpness: everything before threshold/edge detect.
+    final_is_L says a threshold or edge step follows, so only the luminance of the result matters.
+    """
+    # Saturation and grayscale never change luminance, and without per-channel clipping neither do
+    # brightness, contrast, sharpness or invert, so in that case work in 'L' from the start. Above 100,
+    # brightness, contrast, saturation and sharpness (which extrapolates away from a smoothed copy) all
+    # clip per channel, so then the RGB steps come first
+    if final_is_L and brightness_val <= 100 and contrast_val <= 100 and saturation_val <= 100 and sharpness_val <= 100:
+        if image.mode != 'L': image = image.convert('L')
+
+    # Single-channel input (or one reduced to it above): stay in 'L' end-to-end
+    if image.mode in ('L', '1'):
+        return _process_L(image, brightness_val, contrast_val, invert, sharpness_val)
+
+    # --- Apply Color/Tone Adjustments, Grayscale and Invert (single fused pass) ---
+    if saturation_val != 100 or grayscale_val > 0:
+        # When the final step needs 'L', take it straight from the fused buffer. Not with sharpness above 100:
+        # it clips per channel, so sharpening luminance differs from sharpening RGB and taking luminance after
+        image = _apply_fused_adjustments(image, brightness_val, contrast_val, saturation_val, grayscale_val, invert,
+                                         as_luminance=final_is_L and sharpness_val <= 100)
+    elif brightness_val != 100 or contrast_val != 100:
+        image = _apply_tone_lut(image, brightness_val, contrast_val, invert) # No channel mixing: one LUT pass
+    elif invert:
+        image = _invert(image) # Invert alone doesn't need the float buffer
+
+    # --- Apply Effects ---
+    if sharpness_val != 100:
+         enhancer = ImageEnhance.Sharpness(image); sharpness_factor = sharpness_val / 100.0
+         image = enhancer.enhance(sharpness_factor)
+    return image
+
+# Last adjusted image as (source image, adjustment parameters, result), so a change that only touches the
+# final conversion (threshold value, threshold <-> edge) skips the adjustments. Holding the source keeps its
+# id from being reused; processing runs on one worker thread, so a single slot needs no locking.
+_adjusted_cache = (None, None, None)
+
+def luminance_array(image):
+    """Returns the image's luminance as a 2-D uint8 ndarray, the buffer the grid sampler reads."""
+    if image is None: return None
+    return np.asarray(image if image.mode == 'L' else image.convert('L'))
+
 def apply_image_processing(original_image, brightness_val, contrast_val, saturation_val, grayscale_val, invert, sharpness_val, threshold_enabled, threshold_val, edge_detect_enabled):
     """
     Applies all image pre-processing steps based on input parameters.
     Returns the single final processed image after all effects.
     This image is used for BOTH the middle preview AND brightness mapping.
     """
+    global _adjusted_cache
     if not original_image:
         return None
 
-    current_image = original_image.copy()
+    # Fast path: nothing to adjust, hand back the source as-is (every step below returns a new image,
+    # so the source is never modified and no defensive copy is needed)
+    is_identity = (brightness_val == 100 and contrast_val == 100 and saturation_val == 100 and sharpness_val == 100
+                   and grayscale_val == 0 and not invert and not threshold_enabled and not edge_detect_enabled)
+    if is_identity:
+        return original_image
+
     print("Applying image processing...")
 
     try:
-        # --- Apply Color/Tone Adjustments ---
-        is_color = current_image.mode not in ('L', '1')
-        # Convert to RGB for color adjustments if needed, store original mode
-        original_mode = current_image.mode
-        if is_color and (saturation_val != 100 or grayscale_val > 0):
-             if current_image.mode != 'RGB': current_image = current_image.convert('RGB')
-
-        if brightness_val != 100:
-            enhancer = ImageEnhance.Brightness(current_image); current_image = enhancer.enhance(brightness_val / 100.0)
-        if contrast_val != 100:
-            enhancer = ImageEnhance.Contrast(current_image); current_image = enhancer.enhance(contrast_val / 100.0)
-        # Apply saturation only if image is still color *before* grayscale blend
-        if current_image.mode == 'RGB' and saturation_val != 100:
-             enhancer = ImageEnhance.Color(current_image); current_image = enhancer.enhance(saturation_val / 100.0)
-
-        # --- Apply Grayscale ---
-        if grayscale_val > 0:
-             if current_image.mode != 'L':
-                 grayscale_img = current_image.convert('L')
-                 if grayscale_val == 100:
-                     current_image = grayscale_img # Full conversion
-                 else:
-                     # Blend requires RGB modes
-                     current_image_rgb = current_image.convert('RGB') if current_image.mode != 'RGB' else current_image
-                     grayscale_rgb = grayscale_img.convert('RGB')
-                     current_image = Image.blend(current_image_rgb, grayscale_rgb, grayscale_val / 100.0)
-
-        # --- Apply Effects ---
-        if sharpness_val != 100:
-             enhancer = ImageEnhance.Sharpness(current_image); sharpness_factor = sharpness_val / 100.0
-             current_image = enhancer.enhance(sharpness_factor)
-        if invert:
-             # Invert needs careful handling for different modes
-             if current_image.mode == 'L': current_image = ImageOps.invert(current_image)
-             elif current_image.mode == 'RGB': current_image = ImageOps.invert(current_image)
-             elif current_image.mode == 'RGBA':
-                  # Invert RGB, keep alpha
-                  try:
-                      rgb = ImageOps.invert(current_image.convert('RGB')); alpha = current_image.split()[3]
-                      current_image = Image.merge('RGBA', (*rgb.split(), alpha))
-                  except ValueError:
-                      print("Warning: Invert failed for RGBA, skipping.")
-             elif current_image.mode == '1': # Invert B&W
-                 current_image = current_image.point(lambda p: 255 - p) # Simple invert for 0/255
+        # Threshold and edge detect both work on luminance only
+        final_is_L = threshold_enabled or edge_detect_enabled
+
+        # --- Adjustments (reused from the last run if only the final conversion changed) ---
+        adjust_params = (brightness_val, contrast_val, saturation_val, grayscale_val, invert, sharpness_val, final_is_L)
+        cached_source, cached_params, current_image = _adjusted_cache
+        if cached_source is not original_image or cached_params != adjust_params:
+            current_image = _apply_adjustments(original_image, *adjust_params)
+            _adjusted_cache = (original_image, adjust_params, current_image)
 
         # --- Apply Final Conversion (Threshold or Edge Detect) IF enabled ---
-        # These steps modify the image further *only if* selected
-        if edge_detect_enabled:
-             print("Applying Edge Detection...")
-             # Edge detection requires grayscale input
-             base_for_filter = current_image.convert('L') if current_image.mode != 'L' else current_image
-             edge_image = base_for_filter.filter(ImageFilter.FIND_EDGES)
-             current_image = ImageOps.invert(edge_image) # Invert to get black edges on white BG
-        elif threshold_enabled:
-             print(f"Applying threshold: {threshold_val}")
-             # Threshold requires grayscale input
-             base_for_filter = current_image.convert('L') if current_image.mode != 'L' else current_image
-             bw_image = base_for_filter.point(lambda p: 255 if p >= threshold_val else 0, mode='1')
-             current_image = bw_image.convert('L') # Convert back to L mode for consistency
+        current_image = _apply_final_conversion(current_image, threshold_enabled, threshold_val, edge_detect_enabled)
 
         # --- Return the final processed image ---
         print("Image processing applied successfully.")
@@ -79,4 +227,4 @@ def apply_image_processing(original_image, brightness_val, contrast_val, saturat
 
     except Exception as e:
         print(f"Error during image processing: {e}")
-        return None # Indicate failure
\ No newline at end of file
+        return None # Indicate failure
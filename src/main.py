@@ -1,23 +1,21 @@
+import re
 import sys
-import os
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout,
     QFrame, QSizePolicy, QPushButton, QFileDialog, QTextEdit,
-    QGroupBox, QFontComboBox, QSpinBox, QComboBox, QSlider, QCheckBox,
-    QSpacerItem
+    QGroupBox, QFontComboBox, QSpinBox, QComboBox, QSlider, QCheckBox
 )
-from PySide6.QtGui import QPalette, QColor, QPixmap
-from PySide6.QtCore import Qt, Slot, QSize
+from PySide6.QtGui import QPalette, QColor, QPixmap, QImage, QPixmapCache, QPainter, QFontDatabase
+from PySide6.QtCore import Qt, Slot, Signal, QTimer, QObject, QRunnable, QThreadPool, QRect, QPoint
 
 # Import Pillow and helper modules
 from PIL import Image
-from PIL.ImageQt import ImageQt
-from image_processor import apply_image_processing # Import image processing function
+from image_processor import apply_image_processing, luminance_array # Import image processing functions
 from render_engine import ( # Import rendering functions and constants
     update_brightness_map,
     generate_grid_placement,
     render_word_grid,
-    SKIP_RENDER_VALUE,
+    NO_PLACEMENTS,
     ASCII_GRADIENTS, # Use the correct constant name
     DEFAULT_GRADIENT_NAME
 )
@@ -32,6 +30,21 @@ DEFAULT_CONTRAST = 100
 DEFAULT_SATURATION = 100
 DEFAULT_HUE = 0 # Not implemented yet
 DEFAULT_SHARPNESS = 100
+WORD_LIST_DEBOUNCE_MS = 300 # Coalesce word list edits while typing (about a typing pause)
+PROCESSING_MAX_SIZE = 1280 # Long edge of the working copy used for processing and previews
+PREVIEW_SMOOTH_DELAY_MS = 150 # Previews use fast scaling while resizing, smooth once it settles
+PROCESSING_DEBOUNCE_MS = 60 # Coalesce bursts of slider events into one processing pass
+RENDER_DEBOUNCE_MS = 60 # Same for density/font/gradient changes that only need a re-render
+PIXMAP_CACHE_LIMIT_KB = 64 * 1024 # Room for the three previews' pixmaps, a full-size render included
+
+_WORD_SEP = re.compile(r'[,\n]+') # Word list separators: commas and newlines
+
+# PIL modes that map directly onto a QImage format: mode -> (format, bytes per pixel)
+QIMAGE_FORMATS = {
+    'L': (QImage.Format.Format_Grayscale8, 1),
+    'RGB': (QImage.Format.Format_RGB888, 3),
+    'RGBA': (QImage.Format.Format_RGBA8888, 4),
+}
 
 # Helper function to create labeled sliders
 def create_labeled_slider(label_text, min_val, max_val, default_val, parent_layout, change_slot, tooltip=""):
@@ -43,20 +56,69 @@ def create_labeled_slider(label_text, min_val, max_val, default_val, parent_layo
     hbox.addWidget(label); hbox.addWidget(slider); parent_layout.addLayout(hbox)
     return label, slider
 
+def process_image_job(*processing_args):
+    """apply_image_processing plus the luminance buffer for grid sampling, built on the worker thread too.
+    Returns (processed image for the preview, 2-D uint8 array for mapping)."""
+    processed_image = apply_image_processing(*processing_args)
+    return processed_image, luminance_array(processed_image)
+
+def render_grid_job(processed_array, brightness_lut, word_density, output_size, font_name, font_size):
+    """Placement + render in one call so it can run on a worker thread. Returns (placement data, rendered image)."""
+    grid_placement_data = generate_grid_placement(processed_array, brightness_lut, word_density, output_size)
+    return grid_placement_data, render_word_grid(output_size, grid_placement_data, font_name, font_size)
+
+class WorkerSignals(QObject):
+    """Signals for Worker (QRunnable is not a QObject, so it can't emit them itself)."""
+    finished = Signal(int, object) # (generation, result)
+
+class Worker(QRunnable):
+    """Runs fn(*args) on a pool thread and posts the result back to the GUI thread tagged with its generation."""
+    def __init__(self, generation, fn, *args):
+        super().__init__(); self.generation = generation; self.fn = fn; self.args = args; self.signals = WorkerSignals()
+    def run(self):
+        try: result = self.fn(*self.args)
+        except Exception as e: print(f"Error in background task: {e}"); result = None
+        self.signals.finished.emit(self.generation, result) # Queued across threads to the receiver
+
 class PreviewLabel(QLabel):
     """Custom QLabel for previews that handles scaling on resize."""
-    def __init__(self, text=""): super().__init__(text); self.setAlignment(Qt.AlignmentFlag.AlignCenter); self.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored); self.setScaledContents(False); self._pixmap = QPixmap()
+    def __init__(self, text=""):
+        super().__init__(text); self.setAlignment(Qt.AlignmentFlag.AlignCenter); self.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored); self.setScaledContents(False); self._pixmap = QPixmap()
+        # Re-scale smoothly once resizing has paused for a moment
+        self._smooth_timer = QTimer(self); self._smooth_timer.setSingleShot(True); self._smooth_timer.setInterval(PREVIEW_SMOOTH_DELAY_MS); self._smooth_timer.timeout.connect(self._scale_pixmap)
+        self._pending_update = None # Deferred preview update, run once the label can actually show something
+        self._scaled_pixmap = QPixmap(); self._scaled_for = None # Smooth-scaled copy and the (cacheKey, width, height) it was made for
+    def can_display(self): return self.isVisible() and self.width() >= 2 and self.height() >= 2
+    def defer_update(self, callback): self._pending_update = callback
+    def _flush_pending_update(self):
+        if self._pending_update and self.can_display(): callback = self._pending_update; self._pending_update = None; callback()
+    def pixmap(self): return self._pixmap # The source pixmap; it is painted by paintEvent, not QLabel
     def setPixmap(self, pixmap):
-        if pixmap and not pixmap.isNull(): self._pixmap = pixmap; self._scale_pixmap()
-        else: self._pixmap = QPixmap(); super().setPixmap(QPixmap())
-    def clear(self): self._pixmap = QPixmap(); super().clear(); super().setText("")
+        self._pending_update = None
+        if pixmap and not pixmap.isNull(): self._pixmap = pixmap; super().setText(""); self._scale_pixmap()
+        else: self._drop_pixmap()
+    def clear(self): self._pending_update = None; self._drop_pixmap(); super().clear(); super().setText("")
+    def setText(self, text): self._drop_pixmap(); super().setText(text) # Text replaces the image, as in QLabel
+    def _drop_pixmap(self): self._pixmap = QPixmap(); self._scaled_pixmap = QPixmap(); self._scaled_for = None; self.update()
+    def showEvent(self, event): super().showEvent(event); self._flush_pending_update()
     def resizeEvent(self, event):
-        if not self._pixmap.isNull(): self._scale_pixmap()
-        super().resizeEvent(event)
+        # paintEvent blits the source scaled in the meantime; the smooth copy follows once resizing settles
+        if not self._pixmap.isNull(): self._smooth_timer.start()
+        super().resizeEvent(event); self._flush_pending_update()
     def _scale_pixmap(self):
         if self._pixmap.isNull(): return
-        scaled_pixmap = self._pixmap.scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-        super().setPixmap(scaled_pixmap)
+        scaled_for = (self._pixmap.cacheKey(), self.width(), self.height())
+        if scaled_for == self._scaled_for: return # Already made for this pixmap at this size
+        self._scaled_pixmap = self._pixmap.scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+        self._scaled_for = scaled_for; self.update()
+    def paintEvent(self, event):
+        if self._pixmap.isNull(): super().paintEvent(event); return
+        target_size = self._pixmap.size().scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio)
+        target = QRect(QPoint((self.width() - target_size.width()) // 2, (self.height() - target_size.height()) // 2), target_size)
+        painter = QPainter(self)
+        if self._scaled_for == (self._pixmap.cacheKey(), self.width(), self.height()): painter.drawPixmap(target.topLeft(), self._scaled_pixmap)
+        else: painter.drawPixmap(target, self._pixmap) # Scaled during the blit (fast, unfiltered) until the smooth copy is made
+        painter.end()
 
 class MainWindow(QMainWindow):
     """Main application window - Handles UI and state management."""
@@ -66,17 +128,42 @@ class MainWindow(QMainWindow):
         self.setGeometry(100, 100, 1400, 800)
 
         # --- State Variables ---
-        self.original_image = None
+        self.original_image = None # The source as decoded; JPEGs are drafted, so this may be a reduced-scale decode
+        self.original_path = None # File the source came from, to reopen it at full resolution (e.g. for an export)
+        self.original_size = None # Full size of the source, before any reduced-scale decoding
+        self.original_image_small = None # Downscaled working copy fed to the processing pipeline
         self.processed_image = None # Stores result after ALL processing steps
+        self.processed_array = None # Luminance of processed_image as a uint8 ndarray, what the grid samples
         self.rendered_image = None
         self.word_list = []; self.selected_font_name = None; self.selected_font_size = DEFAULT_FONT_SIZE
-        self.brightness_map = {}; self.word_density = DEFAULT_DENSITY; self.grid_placement_data = []
+        self.brightness_lut = (); self.word_density = DEFAULT_DENSITY; self.grid_placement_data = NO_PLACEMENTS
         self.gradient_source = "Custom Word List"; self.selected_ascii_gradient = ASCII_GRADIENTS[DEFAULT_GRADIENT_NAME]
         self.threshold_enabled = False; self.threshold_value = DEFAULT_THRESHOLD
         self.brightness_value = DEFAULT_BRIGHTNESS; self.contrast_value = DEFAULT_CONTRAST
         self.saturation_value = DEFAULT_SATURATION; self.hue_value = DEFAULT_HUE
         self.grayscale_value = 0; self.invert_enabled = False
         self.sharpness_value = DEFAULT_SHARPNESS; self.edge_detect_enabled = False
+        self._proc_cache_key = None # Processing parameters that produced self.processed_image
+        self._pending_proc_key = None # Processing parameters of the run currently in flight
+        self._render_key = None # (processed_array, render parameters) of the last render submitted
+        QPixmapCache.setCacheLimit(PIXMAP_CACHE_LIMIT_KB) # Preview pixmaps, keyed by _pixmap_cache_key
+
+        # Processing and rendering run off the GUI thread, one task at a time per pool. Every request bumps its
+        # generation counter, so a result that arrives after a newer request was made is simply dropped.
+        self._process_pool = QThreadPool(self); self._process_pool.setMaxThreadCount(1); self._process_generation = 0
+        self._render_pool = QThreadPool(self); self._render_pool.setMaxThreadCount(1); self._render_generation = 0
+        self._tasks = {} # Pool -> latest submitted Worker, keeps it (and its signals object) alive
+
+        # Single-shot timer so bursts of word list edits trigger only one parse/render
+        self._word_list_timer = QTimer(self); self._word_list_timer.setSingleShot(True); self._word_list_timer.setInterval(WORD_LIST_DEBOUNCE_MS)
+        self._word_list_timer.timeout.connect(self.parse_word_list_from_text)
+
+        # Single-shot timer that collapses a burst of processing triggers (e.g. a slider drag) into one run
+        self._pending_timer = QTimer(self); self._pending_timer.setSingleShot(True); self._pending_timer.setInterval(PROCESSING_DEBOUNCE_MS)
+        self._pending_timer.timeout.connect(self._do_processing_and_render)
+        # And one for the controls that only affect the render (density, font, gradient)
+        self._render_timer = QTimer(self); self._render_timer.setSingleShot(True); self._render_timer.setInterval(RENDER_DEBOUNCE_MS)
+        self._render_timer.timeout.connect(self._do_render)
 
         # --- UI Setup ---
         self._init_ui()
@@ -128,13 +215,17 @@ class MainWindow(QMainWindow):
         source_group = QGroupBox("Gradient Source"); source_layout = QVBoxLayout()
         self.gradient_source_combo = QComboBox(); self.gradient_source_combo.addItem("Custom Word List"); self.gradient_source_combo.addItems(ASCII_GRADIENTS.keys()); self.gradient_source_combo.currentTextChanged.connect(self.update_gradient_source)
         source_layout.addWidget(self.gradient_source_combo); self.word_list_label = QLabel("Custom Words:"); source_layout.addWidget(self.word_list_label)
-        self.word_list_edit = QTextEdit(); self.word_list_edit.setPlaceholderText("Enter words here..."); self.word_list_edit.setFixedHeight(80); self.word_list_edit.textChanged.connect(self.parse_word_list_from_text)
+        self.word_list_edit = QTextEdit(); self.word_list_edit.setPlaceholderText("Enter words here..."); self.word_list_edit.setFixedHeight(80); self.word_list_edit.textChanged.connect(self._word_list_timer.start)
         source_layout.addWidget(self.word_list_edit); self.load_words_button = QPushButton("Load Words from File (.txt)"); self.load_words_button.clicked.connect(self.load_words_from_file)
         source_layout.addWidget(self.load_words_button); source_group.setLayout(source_layout); left_layout.addWidget(source_group)
 
         # --- Generation & Styling Group ---
         gen_style_group = QGroupBox("Generation & Styling"); gen_style_layout = QVBoxLayout()
-        font_label = QLabel("Font:"); gen_style_layout.addWidget(font_label); self.font_combo = QFontComboBox(); self.font_combo.currentFontChanged.connect(self.update_selected_font); gen_style_layout.addWidget(self.font_combo)
+        font_label = QLabel("Font:"); gen_style_layout.addWidget(font_label); self.font_combo = QFontComboBox()
+        # Only list scalable Latin fonts: skips enumerating every writing system, and rendering goes through
+        # ImageFont.truetype, which can't use bitmap fonts anyway
+        self.font_combo.setWritingSystem(QFontDatabase.WritingSystem.Latin); self.font_combo.setFontFilters(QFontComboBox.FontFilter.ScalableFonts)
+        self.font_combo.currentFontChanged.connect(self.update_selected_font); gen_style_layout.addWidget(self.font_combo)
         size_label = QLabel("Font Size:"); gen_style_layout.addWidget(size_label); self.font_size_spin = QSpinBox(); self.font_size_spin.setRange(6, 72); self.font_size_spin.setValue(self.selected_font_size); self.font_size_spin.valueChanged.connect(self.update_font_size); gen_style_layout.addWidget(self.font_size_spin)
         density_label = QLabel("Density:"); gen_style_layout.addWidget(density_label)
         self.density_spin = QSpinBox(); self.density_spin.setRange(1, MAX_DENSITY); self.density_spin.setValue(self.word_density); self.density_spin.setToolTip(f"Approx items per 100x100 area (Max: {MAX_DENSITY})"); self.density_spin.valueChanged.connect(self.update_density)
@@ -167,21 +258,40 @@ class MainWindow(QMainWindow):
     def _update_single_preview(self, label_widget, image_to_display):
         """Helper to update a specific PreviewLabel widget."""
         if image_to_display:
+            # Hidden or not laid out yet: nothing would be shown, so convert once it can be
+            if not label_widget.can_display():
+                label_widget.defer_update(lambda: self._update_single_preview(label_widget, image_to_display)); return
+            cache_key = self._pixmap_cache_key(image_to_display); cached = QPixmapCache.find(cache_key)
+            if cached is not None: label_widget.setPixmap(cached); return
             try:
                 display_image = image_to_display
-                # Convert specific modes if needed for display, but keep L for processed
-                temp_display_image = display_image
-                if temp_display_image.mode not in ('RGB', 'L', 'RGBA'):
-                    temp_display_image = temp_display_image.convert('RGB')
-                # Ensure RGBA for QPixmap conversion
-                if temp_display_image.mode != 'RGBA':
-                    temp_display_image = temp_display_image.convert('RGBA')
-
-                q_image = ImageQt(temp_display_image); pixmap = QPixmap.fromImage(q_image)
+                # Convert specific modes if needed for display, but keep L/RGB/RGBA as they are
+                if display_image.mode not in QIMAGE_FORMATS:
+                    display_image = display_image.convert('RGBA' if 'A' in display_image.getbands() or 'transparency' in display_image.info else 'RGB')
+
+                # Wrap the raw buffer directly (rows are tightly packed by tobytes); fromImage copies it
+                # into the pixmap, so the bytes only need to outlive this call
+                q_format, bytes_per_pixel = QIMAGE_FORMATS[display_image.mode]
+                width, height = display_image.size; buffer = display_image.tobytes()
+                q_image = QImage(buffer, width, height, width * bytes_per_pixel, q_format); pixmap = QPixmap.fromImage(q_image)
+                QPixmapCache.insert(cache_key, pixmap)
                 label_widget.setPixmap(pixmap)
             except Exception as e: print(f"Error updating preview: {e}"); label_widget.setText(f"Error:\n{e}"); label_widget.setPixmap(QPixmap())
         else: label_widget.clear(); label_widget.setText("N/A")
 
+    def _submit_task(self, pool, generation, slot, fn, *args):
+        """Queues fn(*args) on pool, replacing any task still waiting there; slot gets (generation, result)."""
+        pool.clear() # Tasks that haven't started yet are stale already
+        task = Worker(generation, fn, *args); task.signals.finished.connect(slot)
+        self._tasks[pool] = task; pool.start(task)
+
+    def _drop_cached_pixmap(self, image):
+        """Forgets the cached preview pixmap of an image that is being replaced."""
+        if image is not None: QPixmapCache.remove(self._pixmap_cache_key(image)) # Its id may be reused by the next image
+
+    @staticmethod
+    def _pixmap_cache_key(image): return f"{id(image)}-{image.size}-{image.mode}"
+
     @Slot()
     def open_image_dialog(self):
         """Opens dialog, loads image, updates original preview, triggers processing & render."""
@@ -191,16 +301,29 @@ class MainWindow(QMainWindow):
             if file_paths:
                 image_path = file_paths[0]; print(f"Selected image: {image_path}")
                 try:
-                    self.original_image = Image.open(image_path)
-                    self._update_single_preview(self.original_preview, self.original_image)
+                    self._set_source_image(Image.open(image_path))
+                    self._update_single_preview(self.original_preview, self.original_image_small)
                     self.trigger_processing_and_render()
                     print("Image loaded.")
                 except Exception as e:
                     print(f"Error loading image: {e}")
-                    self.original_image = None; self.processed_image = None; self.rendered_image = None
+                    self.original_image = None; self.original_path = None; self.original_size = None; self.original_image_small = None; self.processed_image = None; self.processed_array = None; self.rendered_image = None; QPixmapCache.clear()
+                    self._process_generation += 1; self._render_generation += 1; self._render_key = None # Drop results still in flight for the old image
                     self.original_preview.clear(); self.processed_preview.clear(); self.render_preview.clear()
                     self.original_preview.setText(f"Error:\n{e}")
 
+    def _set_source_image(self, image):
+        """Stores a newly loaded image along with the downscaled copy used for processing."""
+        self._drop_cached_pixmap(self.original_image_small)
+        self.original_size = image.size # The render is laid out at the source's full size
+        self.original_path = getattr(image, 'filename', None) or None # Set by Image.open; the decode below may be reduced
+        # Not decoded yet: let libjpeg decode at 1/2-1/8 scale, still no smaller than the working copy
+        if image.format == 'JPEG': image.draft('RGB', (PROCESSING_MAX_SIZE, PROCESSING_MAX_SIZE))
+        self.original_image = image
+        # Processing cost scales with pixel count; the previews and grid sampling don't need full resolution
+        self.original_image_small = image.copy(); self.original_image_small.thumbnail((PROCESSING_MAX_SIZE, PROCESSING_MAX_SIZE), Image.Resampling.LANCZOS)
+        self._proc_cache_key = None # A new image may reuse the old one's id()
+
     # --- Image Processing Slots ---
     @Slot(int)
     def update_threshold_enabled(self, state):
@@ -231,7 +354,12 @@ class MainWindow(QMainWindow):
 
     @Slot()
     def trigger_processing_and_render(self):
-        """Slot connected to most processing sliders/checkboxes. Updates state and triggers processing/render."""
+        """Slot connected to most processing sliders/checkboxes. Schedules processing/render (debounced)."""
+        self._pending_timer.start() # Restarts the timer, so only the last event of a burst gets through
+
+    @Slot()
+    def _do_processing_and_render(self):
+        """Updates state from the controls and runs processing followed by the render."""
         # Update internal state from sliders/checkboxes first
         self.brightness_value = self.brightness_slider.value()
         self.contrast_value = self.contrast_slider.value()
@@ -240,9 +368,18 @@ class MainWindow(QMainWindow):
         self.sharpness_value = self.sharpness_slider.value()
         # Checkbox states are updated directly via their specific slots
 
-        # Call the external processing function
-        processed_img = apply_image_processing( # Renamed result variable
-            self.original_image,
+        # Skip the pipeline if nothing that affects processing changed since the last run
+        key = (id(self.original_image_small), self.brightness_value, self.contrast_value, self.saturation_value,
+               self.grayscale_value, self.invert_enabled, self.sharpness_value, self.threshold_enabled,
+               self.threshold_value, self.edge_detect_enabled)
+        self._process_generation += 1 # Supersedes any run still in flight
+        if key == self._proc_cache_key and self.processed_image is not None:
+            self._do_render()
+            return
+
+        # Run the external processing function on the worker pool; _on_processed picks up the result
+        self._submit_task(self._process_pool, self._process_generation, self._on_processed, process_image_job,
+            self.original_image_small,
             self.brightness_value,
             self.contrast_value,
             self.saturation_value,
@@ -253,33 +390,36 @@ class MainWindow(QMainWindow):
             self.threshold_value,
             self.edge_detect_enabled
         )
+        self._pending_proc_key = key
+
+    @Slot(int, object)
+    def _on_processed(self, generation, result):
+        """Receives a processing result from the worker pool (GUI thread) and moves on to the render."""
+        if generation != self._process_generation: return # A newer request is pending, this one is stale
+        processed_img, self.processed_array = result if result else (None, None)
 
         # Store the single processed image
+        if self.processed_image is not processed_img: self._drop_cached_pixmap(self.processed_image)
         self.processed_image = processed_img
+        self._proc_cache_key = self._pending_proc_key if processed_img is not None else None
 
         # Update the middle preview ("Processed Image") with the result
         self._update_single_preview(self.processed_preview, self.processed_image)
 
         # If processing was successful, trigger the final render
         if self.processed_image is not None:
-            self.trigger_render()
+            self._do_render() # Already debounced by the processing timer
         else:
             # Clear render preview if processing failed
-            self.render_preview.clear()
-            self.render_preview.setText("Processing Error")
+            self._clear_render("Processing Error")
 
 
     # --- Gradient/Word List Slots ---
     @Slot()
     def parse_word_list_from_text(self):
-        text = self.word_list_edit.toPlainText(); delimiters = [',', '\n']; words = []; current_word = ''
-        for char in text:
-            if char in delimiters:
-                if current_word: words.append(current_word)
-                current_word = ''
-            else: current_word += char
-        if current_word: words.append(current_word)
-        self.word_list = [word.strip() for word in words if word.strip()]
+        # Split on runs of commas/newlines in a single precompiled-regex call instead of a per-char loop
+        words = (word.strip() for word in _WORD_SEP.split(self.word_list_edit.toPlainText()))
+        self.word_list = [word for word in words if word]
         if self.gradient_source == "Custom Word List":
             self._update_brightness_map_state()
             self.trigger_render()
@@ -324,43 +464,64 @@ class MainWindow(QMainWindow):
     def _update_brightness_map_state(self):
         """Updates the internal brightness map state using the render_engine function."""
         gradient_items = self._get_current_gradient_list()
-        self.brightness_map = update_brightness_map(gradient_items, self.gradient_source)
+        self.brightness_lut = update_brightness_map(gradient_items, self.gradient_source) # 256-entry table, () if no items
 
+    @Slot()
     def trigger_render(self):
+        """Schedules a render (debounced); used by the controls that don't require reprocessing."""
+        self._render_timer.start() # Restarts the timer, so only the last event of a burst gets through
+
+    @Slot()
+    def _do_render(self):
         """Coordinates the steps needed generate and render the WordWeave. Assumes processing is done."""
+        self._render_timer.stop() # Covers any render still scheduled
         print("--- Triggering Render ---")
-        self.rendered_image = None
-        self.render_preview.clear(); self.render_preview.setText("Rendering...")
-        QApplication.processEvents()
 
         # 1. Ensure processed_image exists (created by _apply_image_processing)
-        if not self.processed_image:
-             print("Render cancelled: No processed image available."); self.render_preview.setText("No Processed Image"); return
+        if self.processed_array is None:
+             print("Render cancelled: No processed image available."); self._clear_render("No Processed Image"); return
 
         # 2. Ensure brightness map is updated
         self._update_brightness_map_state()
-        if not self.brightness_map: print("Render cancelled: Brightness map error."); self.render_preview.setText("No Map"); return
-
-        # 3. Generate placement data using the processed_image
-        self.grid_placement_data = generate_grid_placement(
-            self.processed_image, # Use the single processed image
-            self.brightness_map,
-            self.word_density
-        )
-
-        # 4. Render the grid
-        self.rendered_image = render_word_grid(
-            self.original_image.size if self.original_image else (100,100),
-            self.grid_placement_data,
+        if not self.brightness_lut: print("Render cancelled: Brightness map error."); self._clear_render("No Map"); return
+
+        # 3. + 4. Generate placement data from the processed luminance (the grid is laid out at full resolution)
+        # and render the grid, on the worker pool; _on_rendered picks up the result
+        output_size = self.original_size if self.original_size else (100,100)
+        # Skip if these are exactly the inputs of the last render (done or still in flight)
+        render_params = (self.brightness_lut, self.word_density, output_size, self.selected_font_name, self.selected_font_size)
+        if self._render_key and self._render_key[0] is self.processed_array and self._render_key[1] == render_params:
+            print("Render skipped: inputs unchanged."); return
+        self._render_key = (self.processed_array, render_params)
+        self._render_generation += 1 # Supersedes any render still in flight
+        # The previous output stays up until the new one arrives
+        if self.render_preview.pixmap().isNull(): self.render_preview.setText("Rendering...")
+        self._submit_task(self._render_pool, self._render_generation, self._on_rendered, render_grid_job,
+            self.processed_array, # Luminance of the single processed image
+            self.brightness_lut,
+            self.word_density,
+            output_size,
             self.selected_font_name,
             self.selected_font_size
         )
 
+    @Slot(int, object)
+    def _on_rendered(self, generation, result):
+        """Receives a render result from the worker pool (GUI thread) and shows it."""
+        if generation != self._render_generation: return # A newer render is pending, this one is stale
+        self.grid_placement_data, rendered_image = result if result else (NO_PLACEMENTS, None)
+
         # 5. Update the "Output Image" preview
-        if self.rendered_image:
+        if rendered_image:
+            self._drop_cached_pixmap(self.rendered_image); self.rendered_image = rendered_image
             self._update_single_preview(self.render_preview, self.rendered_image)
-        else:
-            if not self.render_preview.text(): self.render_preview.setText("Render Error")
+        else: self._clear_render("Render Error")
+
+    def _clear_render(self, message):
+        """Drops the current output (and any render in flight) and shows message in its preview instead."""
+        self._render_generation += 1; self._render_key = None
+        self._drop_cached_pixmap(self.rendered_image); self.rendered_image = None
+        self.render_preview.clear(); self.render_preview.setText(message)
 
 
 # --- Main Execution ---
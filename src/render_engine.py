@@ -1,8 +1,13 @@
 import math
+import functools
+import importlib.util
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
 # --- Constants ---
 SKIP_RENDER_VALUE = None
+# Optional JIT kernel for exact cell means at full resolution (jit_kernels is only imported on first use)
+NUMBA_AVAILABLE = importlib.util.find_spec('numba') is not None
 FALLBACK_FONTS = ["arial.ttf", "times.ttf", "cour.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf"]
 # Define ASCII Gradients here as well
 ASCII_GRADIENTS = { # Reverted name
@@ -26,50 +31,50 @@ def update_brightness_map(gradient_items, gradient_source_name):
     """
     Creates the mapping from brightness levels (0-255) to gradient items (words/chars).
     Pure white (255) maps to SKIP_RENDER_VALUE.
-    Returns the brightness map dictionary.
+    Returns the brightness map as a 256-entry tuple indexed by brightness (empty if there are no items).
     """
-    brightness_map = {}
+    return _build_brightness_map(tuple(gradient_items), gradient_source_name)
+
+@functools.lru_cache(maxsize=32)
+def _build_brightness_map(gradient_items, gradient_source_name):
+    """Builds the brightness map for update_brightness_map; gradient_items must be a tuple."""
     if not gradient_items:
         print("Gradient source is empty, cannot create brightness map.")
-        return brightness_map
+        return ()
 
     # Use unique items, sorted (alphabetical for words, string order for ASCII)
     unique_items = []
     if gradient_source_name == "Custom Word List":
          unique_items = sorted(list(set(gradient_items)))
     else: # For ASCII gradients, maintain the defined order
-         seen = set()
-         unique_items = [x for x in gradient_items if not (x in seen or seen.add(x))]
+         unique_items = list(dict.fromkeys(gradient_items))
 
     num_items = len(unique_items)
     if num_items == 0:
          print("Gradient source contains no usable items.")
-         return brightness_map
-
-    effective_range = 255.0
-    bucket_size = effective_range / num_items
-    current_threshold = 0.0
-    temp_map = {}
-    for i, item in enumerate(unique_items):
-        upper_threshold = math.ceil(current_threshold + bucket_size)
-        upper_threshold = min(upper_threshold, effective_range - 1)
-        start_brightness = math.floor(current_threshold) + 1 if i > 0 else 0
-        for brightness in range(int(start_brightness), int(upper_threshold) + 1):
-             if brightness < 255: temp_map[brightness] = item
-        current_threshold += bucket_size
-
-    brightness_map = temp_map
-    brightness_map[255] = SKIP_RENDER_VALUE # Explicitly map pure white to skip
+         return ()
+
+    # Item i takes the levels from its bucket start (floor of the running bucket sum, +1) up to the next
+    # item's start; searching all 255 levels against the starts at once gives each level's item
+    bucket_size = 255.0 / num_items
+    bucket_starts = np.floor(np.cumsum(np.full(num_items, bucket_size))[:-1]) + 1 # Running sum, same rounding as adding up
+    item_indices = np.searchsorted(np.concatenate(([0.0], bucket_starts)), np.arange(255), side='right') - 1
+    brightness_map = tuple(unique_items[i] for i in item_indices.tolist()) + (SKIP_RENDER_VALUE,) # Explicitly map pure white to skip
     print(f"Brightness map updated with {num_items} items (plus skip for white).")
     return brightness_map
 
 def get_item_for_brightness(brightness_map, brightness_value):
-    """Returns the word/char/SKIP corresponding to the brightness value."""
-    brightness_value = max(0, min(255, int(brightness_value)))
-    return brightness_map.get(brightness_value, "?") # Use default '?' if somehow missing
+    """Returns the word/char/SKIP corresponding to the brightness value ('?' for an empty map)."""
+    if not brightness_map: return "?"
+    return brightness_map[max(0, min(255, int(brightness_value)))]
 
 def try_load_font(font_name, size):
-    """Attempts to load a font, trying fallbacks if necessary."""
+    """Attempts to load a font, trying fallbacks if necessary (cached per name and size, so share it read-only)."""
+    return _load_font_cached(font_name, size)
+
+@functools.lru_cache(maxsize=64)
+def _load_font_cached(font_name, size):
+    """Loads the font for try_load_font; truetype reads and parses the font file, so each one is loaded once."""
     try: return ImageFont.truetype(font_name, size)
     except IOError:
         print(f"Warning: Font '{font_name}' not found directly. Trying fallbacks...")
@@ -80,83 +85,193 @@ def try_load_font(font_name, size):
         try: return ImageFont.load_default()
         except Exception as e_def: print(f"Error loading Pillow default font: {e_def}"); return None
 
-def generate_grid_placement(processed_image_map, brightness_map, word_density):
-    """Generates word/char placement data based on a grid using processed_image_map."""
-    grid_placement_data = []
-    if not processed_image_map or not brightness_map:
+# Placement data with nothing to place: (items, item indices, x centers, y centers), see generate_grid_placement
+NO_PLACEMENTS = ((), np.empty(0, dtype=np.int16), np.empty(0), np.empty(0))
+_sat_cache = (None, None) # (map, summed-area table) of the last map sampled at output resolution
+
+@functools.lru_cache(maxsize=8)
+def _lut_arrays(brightness_lut):
+    """The brightness table as (distinct items, per-level index into them as an int16 array; -1 where skipped)."""
+    items = tuple(dict.fromkeys(item for item in brightness_lut if item is not SKIP_RENDER_VALUE))
+    position = {item: i for i, item in enumerate(items)}
+    return items, np.array([-1 if item is SKIP_RENDER_VALUE else position[item] for item in brightness_lut], dtype=np.int16)
+
+def _summed_area_table(pixels):
+    """
+    The summed-area table of a 2-D map, padded with a leading zero row and column: sat[y, x] is the sum of
+    pixels[:y, :x]. Cached for the last map (by identity), so a density change only redoes the lookups.
+    uint32 whenever the full sum fits (maps up to ~16.8 megapixels), which is half the memory traffic of int64;
+    the cell sums wrap around in between but come out exact.
+    """
+    global _sat_cache
+    cached_pixels, sat = _sat_cache
+    if cached_pixels is not pixels:
+        sum_dtype = np.uint32 if pixels.size * 255 < 2 ** 32 else np.int64
+        sat = np.pad(pixels.cumsum(0, dtype=sum_dtype).cumsum(1, dtype=sum_dtype), ((1, 0), (1, 0)))
+        _sat_cache = (pixels, sat)
+    return sat
+
+def generate_grid_placement(processed_image_map, brightness_lut, word_density, output_size=None):
+    """
+    Generates word/char placement data based on a grid using processed_image_map.
+    processed_image_map is a 2-D uint8 luminance ndarray (as from luminance_array); a PIL image is also accepted.
+    brightness_lut is the 256-entry brightness map from update_brightness_map.
+    The grid is laid out over output_size (defaults to the map's own size); each cell's brightness is
+    the mean of the matching map region, so the map may be a downscaled working copy. With the map at
+    output resolution it is the exact (truncated) mean over each cell's pixels.
+    Returns the placements as parallel arrays (items, item_indices, xs, ys): items is the tuple of distinct
+    words/chars, item_indices an int16 array into it, xs and ys float arrays of the cell centers, in row-major
+    grid order. NO_PLACEMENTS if there is nothing to place.
+    """
+    grid_placement_data = NO_PLACEMENTS
+    if processed_image_map is None or not brightness_lut:
         print("Cannot generate grid: Missing processed map image or brightness map.")
         return grid_placement_data
 
-    # Ensure map image is 'L' mode for pixel access
-    map_image_l = processed_image_map
-    if map_image_l.mode != 'L':
-        print("Warning: Map image was not 'L' mode, converting.")
-        map_image_l = map_image_l.convert('L')
+    # All the cell math runs on a uint8 luminance array; a PIL map is converted once here
+    if isinstance(processed_image_map, np.ndarray): pixels = processed_image_map
+    else:
+        if processed_image_map.mode != 'L':
+            print("Warning: Map image was not 'L' mode, converting.")
+            processed_image_map = processed_image_map.convert('L')
+        pixels = np.asarray(processed_image_map)
 
-    img_width, img_height = map_image_l.size
-    area_per_100x100 = 100 * 100; total_pixels = img_width * img_height
+    img_height, img_width = pixels.shape
+    out_width, out_height = output_size if output_size else (img_width, img_height)
+    area_per_100x100 = 100 * 100; total_pixels = out_width * out_height
     estimated_total_items = (total_pixels / area_per_100x100) * word_density
     if estimated_total_items <= 0: return grid_placement_data
 
-    aspect_ratio = img_width / img_height if img_height > 0 else 1
+    aspect_ratio = out_width / out_height if out_height > 0 else 1
     num_cols = max(1, int(math.sqrt(estimated_total_items * aspect_ratio)))
     num_rows = max(1, int(math.sqrt(estimated_total_items / aspect_ratio)))
-    cell_width = img_width / num_cols; cell_height = img_height / num_rows
+    cell_width = out_width / num_cols; cell_height = out_height / num_rows
     print(f"Grid: {num_cols}x{num_rows} cells ({cell_width:.1f}x{cell_height:.1f} pixels/cell)")
 
-    try: pixels = map_image_l.load()
-    except Exception as e: print(f"Error accessing pixel data: {e}"); return grid_placement_data
-
-    for r in range(num_rows):
-        for c in range(num_cols):
-            x1, y1 = int(c * cell_width), int(r * cell_height); x2, y2 = int((c + 1) * cell_width), int((r + 1) * cell_height)
-            x1, y1 = max(0, x1), max(0, y1); x2, y2 = min(img_width, x2), min(img_height, y2)
-            if x1 >= x2 or y1 >= y2: continue
-            try:
-                total_brightness = 0; count = 0
-                for y_pix in range(y1, y2):
-                    for x_pix in range(x1, x2): total_brightness += pixels[x_pix, y_pix]; count += 1
-                if count == 0: continue
-                avg_brightness = total_brightness / count
-            except Exception as e_stat: print(f"Error calculating cell brightness at ({r},{c}): {e_stat}"); continue
-
-            item = get_item_for_brightness(brightness_map, avg_brightness)
-            if item is not SKIP_RENDER_VALUE:
-                target_x = (x1 + x2) / 2; target_y = (y1 + y2) / 2
-                grid_placement_data.append((item, (target_x, target_y)))
-
-    print(f"Generated {len(grid_placement_data)} grid placements (skipped white areas).")
+    # Cell bounds along each axis; a cell squeezed to zero pixels by the int() bounds is left out
+    col_x1 = (np.arange(num_cols) * cell_width).astype(int); col_x2 = np.minimum(out_width, (np.arange(1, num_cols + 1) * cell_width).astype(int))
+    row_y1 = (np.arange(num_rows) * cell_height).astype(int); row_y2 = np.minimum(out_height, (np.arange(1, num_rows + 1) * cell_height).astype(int))
+    center_x = (col_x1 + col_x2) / 2; center_y = (row_y1 + row_y2) / 2
+
+    try:
+        # Map at output resolution: average exactly the pixels inside each cell's bounds
+        if (img_width, img_height) == (out_width, out_height) and NUMBA_AVAILABLE:
+            import jit_kernels
+            cell_brightness = jit_kernels.block_mean(pixels, row_y1, row_y2, col_x1, col_x2)
+        elif (img_width, img_height) == (out_width, out_height):
+            # Without numba: four lookups per cell in the map's summed-area table, built once per map
+            sat = _summed_area_table(pixels)
+            cell_sums = sat[row_y2][:, col_x2] - sat[row_y1][:, col_x2] - sat[row_y2][:, col_x1] + sat[row_y1][:, col_x1]
+            cell_brightness = (cell_sums // np.maximum(1, np.outer(row_y2 - row_y1, col_x2 - col_x1))).astype(np.uint8)
+        else:
+            # One resize to the grid size gives every cell's mean brightness: BOX averages exactly the map area
+            # under each cell (the grid spans the whole map, at whatever scale it is), all in C
+            cell_brightness = np.asarray(Image.fromarray(pixels, 'L').resize((num_cols, num_rows), Image.Resampling.BOX))
+    except Exception as e: print(f"Error calculating cell brightness: {e}"); return grid_placement_data
+
+    # Map every cell through the table in one gather (item index per cell), then keep the non-skipped cells
+    lut_items, lut_index = _lut_arrays(tuple(brightness_lut))
+    cell_items = lut_index[cell_brightness]
+    keep = (cell_items >= 0) & (row_y1 < row_y2)[:, None] & (col_x1 < col_x2)[None, :]
+    rows, cols = np.nonzero(keep) # Row-major, same order as walking the grid
+    grid_placement_data = (lut_items, cell_items[rows, cols], center_x[cols], center_y[rows])
+
+    print(f"Generated {len(rows)} grid placements (skipped white areas).")
     return grid_placement_data
 
+def _rasterize_item(font, text, start):
+    """
+    Draws text once into an 'L' mask tile, placed exactly as d.text(..., anchor="mm") would at a position
+    with the given sub-pixel fraction. Returns (tile, anchor_x, anchor_y), the anchor's integer spot in the tile.
+    """
+    left, top, right, bottom = font.getbbox(text, anchor="mm")
+    left, top, right, bottom = math.floor(left), math.floor(top), math.ceil(right), math.ceil(bottom)
+    # The tile always contains the anchor, so the draw origin is never negative (d.text truncates it with int(),
+    # which would round a negative origin the wrong way and shift glyphs that sit right of/below the anchor).
+    # 1px margin: a sub-pixel start can shift the glyphs by up to a pixel
+    anchor_x, anchor_y = 1 - min(left, 0), 1 - min(top, 0)
+    tile = Image.new('L', (anchor_x + max(right, 0) + 1, anchor_y + max(bottom, 0) + 1), 0)
+    ImageDraw.Draw(tile).text((anchor_x + start[0], anchor_y + start[1]), text, fill=255, font=font, anchor="mm")
+    return tile, anchor_x, anchor_y
+
+def _blend_glyph_pixels(canvas, alpha, xs, ys):
+    """
+    Blends black through one glyph tile at many positions at once (xs, ys: arrays of tile corners).
+    Loops over the tile's inked pixels, each one vectorized over every position; positions are distinct
+    grid cells, so no index repeats within a call. Same rounding as Pillow's mask blend (DIV255).
+    """
+    for dy, dx in zip(*np.nonzero(alpha)):
+        a = int(alpha[dy, dx]); rows = ys + dy; cols = xs + dx
+        if a == 255: canvas[rows, cols] = 0; continue
+        blended = canvas[rows, cols].astype(np.uint32) * (255 - a) + 128
+        canvas[rows, cols] = ((blended >> 8) + blended) >> 8
+
 def render_word_grid(original_image_size, grid_placement_data, font_name, font_size):
-    """Renders the words/chars based on placement data."""
+    """Renders the words/chars based on placement data (the parallel arrays from generate_grid_placement)."""
     if not original_image_size: return None
     render_width, render_height = original_image_size
 
-    if not grid_placement_data:
+    if not grid_placement_data or not len(grid_placement_data[2]):
          print("Render skipped: No items to place.")
          return Image.new('RGB', (render_width, render_height), color=(255, 255, 255))
 
-    img = Image.new('RGB', (render_width, render_height), color = (255, 255, 255))
-    d = ImageDraw.Draw(img)
     font = try_load_font(font_name, font_size)
 
     if font is None:
         print(f"Render failed: Could not load font '{font_name}'")
         return None # Indicate failure
 
-    rendered_count = 0
-    for item, (target_x, target_y) in grid_placement_data:
-        if item is SKIP_RENDER_VALUE: continue # Should be pre-filtered
-        try:
-            # Use anchor='mm' for centering if available (newer Pillow)
-            try: d.text((target_x, target_y), str(item), fill=(0, 0, 0), font=font, anchor="mm")
-            except TypeError: # Fallback for older Pillow
-                bbox = d.textbbox((0, 0), str(item), font=font); text_width = bbox[2] - bbox[0]; text_height = bbox[3] - bbox[1]
-                draw_x = target_x - text_width / 2; draw_y = target_y - text_height / 2
-                d.text((draw_x, draw_y), str(item), fill=(0, 0, 0), font=font)
-            rendered_count += 1
-        except Exception as e: print(f"Error drawing item '{item}': {e}")
+    # Anchor support (newer Pillow) is checked once up front, not per glyph
+    try: font.getbbox("x", anchor="mm"); supports_anchor = True
+    except TypeError: supports_anchor = False # Older Pillow, drawn with the fallback below
+
+    # Group the placements by glyph tile: (item, sub-pixel start) -> integer anchor positions, all at once by
+    # sorting on the keys. generate_grid_placement never emits SKIP_RENDER_VALUE, so every placement is drawn
+    items, item_indices, target_xs, target_ys = grid_placement_data
+    anchor_xs = np.floor(target_xs).astype(np.int64); anchor_ys = np.floor(target_ys).astype(np.int64)
+    starts_x, start_x_of = np.unique(target_xs - anchor_xs, return_inverse=True) # A handful of fractions per axis
+    starts_y, start_y_of = np.unique(target_ys - anchor_ys, return_inverse=True)
+    group_keys = (item_indices.astype(np.int64) * len(starts_x) + start_x_of) * len(starts_y) + start_y_of
+    order = np.argsort(group_keys, kind='stable'); keys, counts = np.unique(group_keys[order], return_counts=True)
+    members = np.split(order, np.cumsum(counts)[:-1])
+
+    # Each distinct tile is rasterized once. Tiles placed more often than they have inked pixels are blended
+    # per pixel across all their positions on a NumPy canvas (padded so no position needs clipping); the
+    # rest are pasted one by one. Black-over-white blends commute, so the order doesn't matter.
+    vectorized = []; pasted = []; pad = 0
+    for key, member in zip(keys.tolist(), members):
+        index, start_key = divmod(key, len(starts_x) * len(starts_y)); xs = anchor_xs[member]; ys = anchor_ys[member]
+        text = str(items[index]); start = (float(starts_x[start_key // len(starts_y)]), float(starts_y[start_key % len(starts_y)]))
+        glyph = None
+        if supports_anchor:
+            try: glyph = _rasterize_item(font, text, start)
+            except Exception as e: print(f"Error drawing item '{text}': {e}"); continue
+        if glyph:
+            alpha = np.asarray(glyph[0])
+            if len(xs) >= 2 * np.count_nonzero(alpha):
+                vectorized.append((alpha, xs - glyph[1], ys - glyph[2])); pad = max(pad, *alpha.shape); continue
+        pasted.append((text, start, glyph, xs.tolist(), ys.tolist()))
+
+    canvas = np.full((render_height + 2 * pad, render_width + 2 * pad), 255, dtype=np.uint8)
+    for alpha, xs, ys in vectorized: _blend_glyph_pixels(canvas, alpha, xs + pad, ys + pad)
+    img = Image.fromarray(canvas[pad:pad + render_height, pad:pad + render_width], 'L').convert('RGB')
+    d = ImageDraw.Draw(img)
+
+    rendered_count = sum(len(xs) for _, xs, _ in vectorized)
+    sizes = {} # Fallback only: text -> (width, height), measured once per distinct item
+    for text, start, glyph, xs, ys in pasted:
+        try: # Per tile, not per position: pasting at in-canvas positions can't fail once the tile is drawn
+            if glyph:
+                tile, anchor_x, anchor_y = glyph
+                for x, y in zip(xs, ys): img.paste((0, 0, 0), (x - anchor_x, y - anchor_y), tile) # Tile through itself as mask, like d.text
+            else: # Fallback for older Pillow
+                if text not in sizes:
+                    bbox = d.textbbox((0, 0), text, font=font); sizes[text] = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+                text_width, text_height = sizes[text]
+                offset_x = start[0] - text_width / 2; offset_y = start[1] - text_height / 2
+                for x, y in zip(xs, ys): d.text((x + offset_x, y + offset_y), text, fill=(0, 0, 0), font=font)
+            rendered_count += len(xs)
+        except Exception as e: print(f"Error drawing item '{text}': {e}")
 
     print(f"Rendered {rendered_count} items onto grid using font '{font.path if hasattr(font, 'path') else font_name}'.")
-    return img
\ No newline at end of file
+    return img